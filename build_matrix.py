@@ -1,9 +1,19 @@
 import json
 import hashlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+
+try:  # optional: faster manifest serialization; stdlib json fallback
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # ---------------------------
@@ -34,17 +44,50 @@ OUT_FILES = {
     "health": "health_report.csv",
     "summary": "summary.txt",
     "manifest": "manifest.json",
+    # sha256 cache keyed by (path, mtime_ns, size); local only, see .gitignore
+    "hash_cache": ".hash_cache.json",
+    # per-ticker parsed series, reused while the source sha256 is unchanged; local only
+    "series_cache": "_cache",
+}
+
+# Price matrix dtype (in-memory + parquet). float32 (~7 significant digits) is ample
+# for adjusted closes and halves matrix bandwidth; set to np.float64 if needed.
+PRICE_DTYPE = np.float32
+
+# Dense float matrix: zstd beats snappy on size; dictionary encoding buys nothing
+PARQUET_OPTIONS = {
+    "engine": "pyarrow",
+    "compression": "zstd",
+    "compression_level": 3,
+    "row_group_size": 50_000,
+    "use_dictionary": False,
+    "write_statistics": True,
 }
 
+# Datetime unit for every series index (older pyarrow/pandas hand back ns)
+DATE_UNIT = "us"
+
+# Fixed CSV layout shared by us/ and tw/ (see clean_single_csv_generic)
+CSV_READ_OPTIONS = pacsv.ReadOptions(skip_rows=3, column_names=["Date", "AdjClose"])
+CSV_PARSE_OPTIONS = pacsv.ParseOptions(delimiter=",")
+CSV_CONVERT_OPTIONS = pacsv.ConvertOptions(
+    column_types={"Date": pa.timestamp(DATE_UNIT), "AdjClose": pa.float64()},
+    # Supports YYYY-MM-DD and YYYY/M/D
+    timestamp_parsers=[pacsv.ISO8601, "%Y/%m/%d"],
+)
+
 # ---------------------------
 
 
 def sha256_file(p: Path) -> str:
-    h = hashlib.sha256()
     with p.open("rb") as f:
+        # Python 3.11+: read + hash in one C-level loop
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
-    return h.hexdigest()
+        return h.hexdigest()
 
 
 def clean_single_csv_generic(path: Path) -> pd.Series:
@@ -55,25 +98,104 @@ def clean_single_csv_generic(path: Path) -> pd.Series:
     - columns: Date, AdjClose
     - Date format: ISO (YYYY-MM-DD) OR YYYY/M/D (may not be zero-padded)
     Deterministic guards:
-    - normalize date
+    - parse date at day resolution
     - sort by date
     - drop duplicates keep last
     """
-    df = pd.read_csv(path, skiprows=3, header=None, names=["Date", "AdjClose"])
-
-    # Robust date parsing: supports YYYY-MM-DD and YYYY/M/D
-    df["Date"] = pd.to_datetime(df["Date"], errors="raise").dt.normalize()
-
+    # Arrow C++ reader with explicit schema; raises on unparseable date/price
+    df = pacsv.read_csv(
+        path,
+        read_options=CSV_READ_OPTIONS,
+        parse_options=CSV_PARSE_OPTIONS,
+        convert_options=CSV_CONVERT_OPTIONS,
+    ).to_pandas()
+
+    # Date-only input -> already at day resolution, no normalize needed
     df = df.sort_values("Date")
     df = df.drop_duplicates("Date", keep="last")
 
-    df["AdjClose"] = pd.to_numeric(df["AdjClose"], errors="raise")
-
     s = df.set_index("Date")["AdjClose"]
     s.name = path.stem.upper()
     return s
 
 
+def load_hash_cache(path: Path) -> dict[str, dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def cached_sha256(p: Path, hash_cache: dict[str, dict]) -> dict:
+    """Return {"mtime_ns", "size", "sha256"} for p, re-hashing only if mtime/size changed."""
+    st = p.stat()
+    hit = hash_cache.get(p.as_posix())
+    if hit and hit.get("mtime_ns") == st.st_mtime_ns and hit.get("size") == st.st_size:
+        return hit
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha256_file(p)}
+
+
+def load_series_cached(p: Path, sha256: str, cache_dir: Path) -> pd.Series:
+    """
+    clean_single_csv_generic(p), memoized as {cache_dir}/{TICKER}.parquet.
+    The cached file carries the source sha256 in its schema metadata and is only
+    reused when it matches, so a stale or half-written cache just gets rebuilt.
+    Either way the index comes back in DATE_UNIT, whichever pyarrow wrote the cache.
+    """
+    cache_path = cache_dir / f"{p.stem.upper()}.parquet"
+    if cache_path.exists():
+        try:
+            table = pq.read_table(cache_path)
+            if (table.schema.metadata or {}).get(b"source_sha256") == sha256.encode():
+                s = table.to_pandas()["AdjClose"]
+                s.index = s.index.as_unit(DATE_UNIT)
+                s.name = p.stem.upper()
+                return s
+        except (OSError, pa.ArrowInvalid, KeyError):
+            pass
+
+    s = clean_single_csv_generic(p)
+    s.index = s.index.as_unit(DATE_UNIT)
+    table = pa.Table.from_pandas(s.rename("AdjClose").to_frame())
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"source_sha256": sha256.encode()}
+    )
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    pq.write_table(table, tmp_path)
+    tmp_path.replace(cache_path)
+    return s
+
+
+def load_one(
+    p: Path, hash_cache: dict[str, dict], cache_dir: Path
+) -> tuple[Path, pd.Series, dict]:
+    # Arrow CSV parsing and hashlib both release the GIL -> safe to thread
+    hash_entry = cached_sha256(p, hash_cache)
+    return p, load_series_cached(p, hash_entry["sha256"], cache_dir), hash_entry
+
+
+def align_to_master(
+    master_dates: pd.DatetimeIndex, series: list[pd.Series], dtype=np.float64
+) -> np.ndarray:
+    """
+    Scatter each (sorted, de-duplicated) series onto the master calendar.
+    Equivalent to s.reindex(master_dates) per column, but writes straight into a
+    preallocated `dtype` matrix (dates not on master -> dropped, master dates
+    missing from series -> NaN), via one np.searchsorted per series.
+    """
+    # Compare raw int64 dates only after putting every index on master's unit
+    unit = master_dates.unit
+    master_i8 = master_dates.values.view("i8")
+    n = len(master_i8)
+    out = np.full((n, len(series)), np.nan, dtype=dtype)
+    for j, s in enumerate(series):
+        s_i8 = s.index.as_unit(unit).values.view("i8")
+        pos = np.searchsorted(master_i8, s_i8)
+        mask = (pos < n) & (master_i8[np.clip(pos, 0, n - 1)] == s_i8)
+        out[pos[mask], j] = s.to_numpy(dtype=np.float64)[mask]
+    return out
+
+
 def pick_master_ticker(preferred_master: list[str], available: set[str]) -> str:
     for t in preferred_master:
         if t in available:
@@ -85,6 +207,14 @@ def write_text(path: Path, text: str) -> None:
     path.write_text(text, encoding="utf-8")
 
 
+def write_json(path: Path, obj: dict) -> None:
+    # Same bytes either way: UTF-8 (non-ASCII kept), 2-space indent
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        write_text(path, json.dumps(obj, ensure_ascii=False, indent=2))
+
+
 def build_market(market: str) -> None:
     cfg = MARKETS[market]
     in_dir: Path = cfg["in_dir"]
@@ -102,26 +232,56 @@ def build_market(market: str) -> None:
     # Load series
     series_map: dict[str, pd.Series] = {}
     file_meta: dict[str, dict] = {}
-    for p in csv_files:
+    out_hash_cache = out_dir / OUT_FILES["hash_cache"]
+    hash_cache = load_hash_cache(out_hash_cache)
+    new_hash_cache: dict[str, dict] = {}
+    series_cache_dir = out_dir / OUT_FILES["series_cache"]
+    series_cache_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=min(16, len(csv_files))) as ex:
+        results = sorted(
+            ex.map(lambda p: load_one(p, hash_cache, series_cache_dir), csv_files),
+            key=lambda r: r[0].stem,
+        )
+    for p, s, hash_entry in results:
+        series_map[p.stem.upper()] = s
+        new_hash_cache[p.as_posix()] = hash_entry
+
+    tickers = sorted(series_map.keys())
+
+    # Per-ticker date stats straight from the sorted int64 date arrays
+    # (all on DATE_UNIT first, so the i8 values share one scale)
+    ticker_i8_arrays = [
+        series_map[t].index.as_unit(DATE_UNIT).values.view("i8") for t in tickers
+    ]
+    date_dtype = np.dtype(f"M8[{DATE_UNIT}]")
+    min_dates = pd.DatetimeIndex(np.array([a[0] for a in ticker_i8_arrays]).view(date_dtype))
+    max_dates = pd.DatetimeIndex(np.array([a[-1] for a in ticker_i8_arrays]).view(date_dtype))
+    n_rows = np.array([a.size for a in ticker_i8_arrays], dtype=np.int64)
+    min_date_str = min_dates.strftime("%Y-%m-%d").tolist()
+    max_date_str = max_dates.strftime("%Y-%m-%d").tolist()
+    ticker_pos = {t: i for i, t in enumerate(tickers)}
+
+    for p, _, hash_entry in results:
         t = p.stem.upper()
-        s = clean_single_csv_generic(p)
-        series_map[t] = s
+        i = ticker_pos[t]
         file_meta[t] = {
             "file": str(p.as_posix()),
-            "sha256": sha256_file(p),
-            "rows": int(s.shape[0]),
-            "min_date": str(s.index.min().date()),
-            "max_date": str(s.index.max().date()),
+            "sha256": hash_entry["sha256"],
+            "rows": int(n_rows[i]),
+            "min_date": min_date_str[i],
+            "max_date": max_date_str[i],
         }
 
-    tickers = sorted(series_map.keys())
     master = pick_master_ticker(preferred_master, set(tickers))
     master_dates = series_map[master].index
 
     # Build FULL matrix aligned to master calendar
-    df = pd.DataFrame(index=master_dates)
-    for t in tickers:
-        df[t] = series_map[t].reindex(master_dates)
+    # (one consolidated PRICE_DTYPE block, no per-column inserts / hash joins)
+    df = pd.DataFrame(
+        align_to_master(master_dates, [series_map[t] for t in tickers], dtype=PRICE_DTYPE),
+        index=master_dates,
+        columns=tickers,
+    )
 
     out_dir.mkdir(parents=True, exist_ok=True)
 
@@ -132,39 +292,45 @@ def build_market(market: str) -> None:
     out_manifest = out_dir / OUT_FILES["manifest"]
 
     # Save matrix (parquet)
-    df.to_parquet(out_prices)
+    df.to_parquet(out_prices, **PARQUET_OPTIONS)
 
     # True month-end trading days from master calendar
-    month_end_dates = (
-        pd.DataFrame({"MonthEndDate": master_dates})
-        .assign(Year=master_dates.year, Month=master_dates.month)
-        .groupby(["Year", "Month"], as_index=False)["MonthEndDate"]
-        .max()
+    # (master_dates is sorted -> month end = last row before (year, month) changes)
+    ym = (
+        master_dates.year.to_numpy(dtype=np.int32) * 12
+        + master_dates.month.to_numpy(dtype=np.int32)
+    )
+    last_idx = np.flatnonzero(np.r_[np.diff(ym) != 0, True])
+    month_end = master_dates[last_idx]
+    month_end_dates = pd.DataFrame(
+        {
+            "Year": month_end.year,
+            "Month": month_end.month,
+            "MonthEndDate": month_end.strftime("%Y-%m-%d"),
+        }
     )
-    month_end_dates["MonthEndDate"] = month_end_dates["MonthEndDate"].dt.strftime("%Y-%m-%d")
     month_end_dates.to_csv(out_month_ends, index=False, encoding="utf-8-sig")
 
     # Health report (human-readable, Excel-friendly)
-    master_max = master_dates.max().date()
-    rows = []
-    for t in tickers:
-        s = series_map[t]
-        rows.append(
-            {
-                "Ticker": t,
-                "MinDate": str(s.index.min().date()),
-                "MaxDate": str(s.index.max().date()),
-                "Rows": int(s.shape[0]),
-                "LagToMasterMax_Days": int((master_max - s.index.max().date()).days),
-            }
-        )
-    health = pd.DataFrame(rows).sort_values(
+    health = pd.DataFrame(
+        {
+            "Ticker": tickers,
+            "MinDate": min_date_str,
+            "MaxDate": max_date_str,
+            "Rows": n_rows,
+            "LagToMasterMax_Days": (master_dates.max() - max_dates).days.to_numpy(np.int64),
+        }
+    ).sort_values(
         ["LagToMasterMax_Days", "Ticker"], ascending=[False, True]
     )
 
     # Missing stats on the FULL matrix (informational; not treated as error)
-    missing_counts = df.isna().sum().astype(int)
-    health["MissingInFullMatrix"] = health["Ticker"].map(missing_counts.to_dict()).astype(int)
+    # (single np.isnan pass over the one float block; no isna() DataFrame)
+    missing_counts = pd.Series(
+        np.isnan(df.to_numpy(copy=False)).sum(axis=0).astype(np.int64), index=df.columns
+    )
+    nan_cells = int(missing_counts.sum())
+    health["MissingInFullMatrix"] = missing_counts.reindex(health["Ticker"]).to_numpy(dtype=np.int64)
     health["MissingPctInFullMatrix"] = (
         health["MissingInFullMatrix"] / len(master_dates) * 100.0
     ).round(3)
@@ -187,7 +353,7 @@ def build_market(market: str) -> None:
             "cols": int(df.shape[1]),
             "min_date": str(df.index.min().date()),
             "max_date": str(df.index.max().date()),
-            "nan_cells": int(df.isna().sum().sum()),
+            "nan_cells": nan_cells,
         },
         "month_ends": {
             "path": str(out_month_ends.as_posix()),
@@ -198,10 +364,14 @@ def build_market(market: str) -> None:
         },
         "files": file_meta,
     }
-    out_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_manifest, manifest)
+
+    # Hash cache (atomic replace; only files seen this run are kept)
+    tmp_hash_cache = out_hash_cache.with_name(out_hash_cache.name + ".tmp")
+    write_json(tmp_hash_cache, new_hash_cache)
+    tmp_hash_cache.replace(out_hash_cache)
 
     # Summary (the one you actually look at)
-    nan_cells = int(df.isna().sum().sum())
     summary = []
     summary.append(f"Data Layer Summary (FULL matrix) — {market.upper()}\n")
     summary.append("================================\n\n")
@@ -217,16 +387,20 @@ def build_market(market: str) -> None:
     lag_sorted = health[["Ticker", "LagToMasterMax_Days"]].sort_values(
         "LagToMasterMax_Days", ascending=False
     )
-    for _, r in lag_sorted.iterrows():
-        summary.append(f"- {r['Ticker']}: {int(r['LagToMasterMax_Days'])}\n")
+    for t, lag in zip(
+        lag_sorted["Ticker"].tolist(), lag_sorted["LagToMasterMax_Days"].astype(int).tolist()
+    ):
+        summary.append(f"- {t}: {lag}\n")
     summary.append("\nTop missing ratios in FULL matrix (often just late inception):\n")
     miss_sorted = (
         health[["Ticker", "MissingPctInFullMatrix"]]
         .sort_values("MissingPctInFullMatrix", ascending=False)
         .head(8)
     )
-    for _, r in miss_sorted.iterrows():
-        summary.append(f"- {r['Ticker']}: {float(r['MissingPctInFullMatrix'])}%\n")
+    for t, pct in zip(
+        miss_sorted["Ticker"].tolist(), miss_sorted["MissingPctInFullMatrix"].astype(float).tolist()
+    ):
+        summary.append(f"- {t}: {pct}%\n")
 
     write_text(out_summary, "".join(summary))
 
@@ -38,17 +38,25 @@ yf_rename = {
 os.makedirs("tw", exist_ok=True)
 os.makedirs("us", exist_ok=True)
 
-def download_adj_close(ticker, folder):
-    print("Downloading", ticker)
-    df = yf.download(ticker, start="2000-01-01", auto_adjust=True)
-    if df.empty:
-        print("⚠ No data:", ticker)
-        return
-    df = df[["Close"]]            # auto_adjust=True → Close = Adjusted Close
-    df.rename(columns={"Close": "AdjClose"}, inplace=True)
-    save_name = yf_rename.get(ticker, ticker)
-    df.to_csv(f"{folder}/{save_name}.csv")
-    print("Saved:", folder, save_name)
+def download_adj_close(tickers, folder):
+    """一次批次下載整個 folder 的 tickers（yfinance 內部 thread pool 平行抓），
+    再逐檔寫出與單檔下載相同的 3 行表頭格式（Price/Ticker/Date）。"""
+    print("Downloading", folder, f"({len(tickers)} tickers)")
+    data = yf.download(tickers, start="2000-01-01", auto_adjust=True,
+                       group_by="ticker", threads=True, progress=False)
+    for ticker in tickers:
+        # 批次結果的 index 是所有 ticker 日期的聯集 → 去掉本檔沒有報價的列
+        if data.empty or ticker not in data.columns.get_level_values(0):
+            df = pd.DataFrame()
+        else:
+            df = data[ticker][["Close"]].dropna()   # auto_adjust=True → Close = Adjusted Close
+        if df.empty:
+            print("⚠ No data:", ticker)
+            continue
+        df.columns = pd.MultiIndex.from_tuples([("AdjClose", ticker)], names=["Price", "Ticker"])
+        save_name = yf_rename.get(ticker, ticker)
+        df.to_csv(f"{folder}/{save_name}.csv")
+        print("Saved:", folder, save_name)
 
 
 # ============================================================
@@ -154,8 +162,6 @@ def update_twd_fx():
         print(f"⚠ yfinance fallback 也失敗：{e}；TWD=X 本次未更新")
 
 
-for t in tickers_tw:
-    download_adj_close(t, "tw")
-for t in tickers_us:
-    download_adj_close(t, "us")
+download_adj_close(tickers_tw, "tw")
+download_adj_close(tickers_us, "us")
 update_twd_fx()